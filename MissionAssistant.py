@@ -1,15 +1,45 @@
 #!/user/bin/python
 
 import os
-import math
+import io
+import re
 import logging
+import logging.handlers
+import functools
+import collections
+import multiprocessing
 from os import write
-from PIL import Image, ExifTags, UnidentifiedImageError
+import exifread
 import xml.etree.ElementTree as ET
-from simplekml import Kml, Style, Polygon, Color
 import argparse
 import sys, getopt
-from scipy.spatial import ConvexHull
+import numpy as np
+from scipy.spatial import ConvexHull, QhullError
+
+# DJI writes the gimbal angles as signed attributes of rdf:Description, e.g. drone-dji:GimbalPitchDegree="-90.00"
+# One pattern for both angles, so the XMP is swept once rather than once per angle
+_GIMBAL_RE = re.compile(rb'Gimbal(Pitch|Yaw)Degree="([-+]?[0-9.]+)"')
+# Namespace qualified names for the ElementTree fallback
+_NS_DESC = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}Description"
+_NS_PITCH = "{http://www.dji.com/drone-dji/1.0/}GimbalPitchDegree"
+_NS_YAW = "{http://www.dji.com/drone-dji/1.0/}GimbalYawDegree"
+JPG_SUFFIXES = ('.jpg', '.jpeg', '.JPG', '.JPEG') # One str.endswith call checks them all
+JPEG_HEAD_BYTES = 128 * 1024 # Read in one go, the EXIF segment (incl. thumbnail) fits in this for the supported cameras
+_XMP_APP1_ID = b"http://ns.adobe.com/xap/1.0/\x00" # An APP1 segment starting with this holds the XMP packet
+
+# KML templates. Placemarks are plain strings so no object tree is built per image.
+KML_BUFFER_BYTES = 1 << 20 # Large write buffer, the KML files are written in many small pieces
+KML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2">\n<Document>\n'
+KML_FOOTER = '</Document>\n</kml>\n'
+KML_NADIR_STYLE = ('<Style id="nadir"><IconStyle><Icon><href>http://maps.google.com/mapfiles/kml/shapes/placemark_circle.png</href></Icon></IconStyle>'
+                   '<LabelStyle><color>ff0000ff</color></LabelStyle></Style>\n') # Red label
+KML_CARDINAL_STYLE = ('<Style id="dir{0}"><IconStyle><heading>{1}</heading>'
+                      '<Icon><href>https://earth.google.com/images/kml-icons/track-directional/track-0.png</href></Icon></IconStyle></Style>\n')
+KML_HULL_STYLE = ('<Style id="hull"><LineStyle><color>ff008000</color><width>5</width></LineStyle>'
+                  '<PolyStyle><color>00000000</color><fill>1</fill></PolyStyle></Style>\n') # Green outline, 00 for transparent and ff for opaque fill
+KML_POINT = '<Placemark><name>{0}</name><styleUrl>#{1}</styleUrl><Point><coordinates>{2},{3}</coordinates></Point></Placemark>\n'
+KML_POLYGON = ('<Placemark><name>{0}</name><styleUrl>#{1}</styleUrl><Polygon><outerBoundaryIs><LinearRing>'
+               '<coordinates>{2}</coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark>\n')
 
 def get_args():
         parser = argparse.ArgumentParser("MissionAssistant:", description="Mission Assistant: Inspect drone images on site to detect problems. It also generates a KML polygon of site boundary based on images chosen.",
@@ -55,6 +85,27 @@ def get_args():
             args_dict["outfolder"] = args_dict["infolder"]
         return args_dict
 
+def save_kml(outputlocation, fragments):
+    """Writes a KML document made of the given list of KML fragments"""
+    with open(outputlocation, 'w', encoding='utf-8') as kml_file:
+        kml_file.write(KML_HEADER)
+        kml_file.write(''.join(fragments))
+        kml_file.write(KML_FOOTER)
+
+def iter_jpgs(root):
+    """Yields the directory entries of all JPG images in root and its subfolders"""
+    try:
+        it = os.scandir(root)
+    except OSError as Ex: # e.g. System Volume Information on a drive root. Skip it like os.walk did.
+        logging.warning("Unable to read folder %s: %s", root, Ex)
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_jpgs(entry.path)
+            elif entry.name.endswith(JPG_SUFFIXES) and entry.is_file(): # Only pick JPG images, name check first as it is cheapest
+                yield entry
+
 class ImageMetadata:
     def __init__(self, imagename):
         self.image_name = imagename
@@ -63,96 +114,187 @@ class ImageMetadata:
         self.camera_yaw = None
         self.camera_pitch = None
         self.camera_altitude = None
-        self.camera_latitude = None
-        self.camera_longitude = None
+        self.camera_latitude_dms = None   # (degrees, minutes, seconds), converted for all images at once by InspectImages
+        self.camera_latitude_ref = None
+        self.camera_longitude_dms = None
+        self.camera_longitude_ref = None
+        self.xmp = None # Raw XMP packet, parsed for pitch and yaw by read_gimbal_angles
 
-        gps_all = {}
-        try:
-            pil_img = Image.open(imagename)
-            exif = {ExifTags.TAGS[k]: v for k, v in pil_img._getexif().items() if k in ExifTags.TAGS}
-            
-            self.camera_maker = exif['Make'].rstrip('\x00')
-            self.camera_model = exif['Model'].rstrip('\x00')
-            
-            for key in exif['GPSInfo'].keys():
-                decoded_value = ExifTags.GPSTAGS.get(key)
-                gps_all[decoded_value] = exif['GPSInfo'][key]
-            
-            long_ref = gps_all.get("GPSLongitudeRef")
-            longitude = gps_all.get("GPSLongitude")
-            lat_ref = gps_all.get("GPSLatitudeRef")
-            latitude = gps_all.get("GPSLatitude")
-            
-            if long_ref == "W":
-                self.camera_longitude = long_in_degrees = -abs(ImageMetadata.convert_to_degrees(longitude))
-            else:
-                self.camera_longitude = ImageMetadata.convert_to_degrees(longitude)
-                
-            if lat_ref == "S":
-                self.camera_latitude = -abs(ImageMetadata.convert_to_degrees(latitude))
-            else:
-                self.camera_latitude = ImageMetadata.convert_to_degrees(latitude)
-                
-            self.camera_altitude = float(gps_all.get("GPSAltitude"))
-            
-        except Exception as Ex:
-            logging.error("Exception while reading {} image metadata: {}".format(imagename, Ex))
-            raise # I consider this fatal since we did find relevant exif metadata
+        tags, self.xmp = ImageMetadata.read_metadata(imagename)
+        
+        maker = tags.get('Image Make')
+        model = tags.get('Image Model')
+        if maker is not None:
+            self.camera_maker = maker.values.rstrip('\x00')
+        if model is not None:
+            self.camera_model = model.values.rstrip('\x00')
+        
+        if 'Image GPSInfo' not in tags:
+            logging.error("No GPS information in %s", imagename)
+            return # camera_latitude/longitude stay None, nothing else to do for this image
+        
+        longitude = tags.get('GPS GPSLongitude')
+        latitude = tags.get('GPS GPSLatitude')
+        altitude = tags.get('GPS GPSAltitude')
+        if longitude is None or latitude is None or altitude is None:
+            logging.error("Incomplete GPS information in %s", imagename)
+            return
+        
+        try: # Only a malformed value (e.g. a zero denominator) gets here
+            longitude = ImageMetadata.convert_to_dms(longitude.values)
+            latitude = ImageMetadata.convert_to_dms(latitude.values)
+            altitude = float(altitude.values[0])
+        except (IndexError, TypeError, ValueError, ZeroDivisionError) as Ex:
+            logging.error("Invalid GPS information in %s: %s", imagename, Ex)
+            return
+        
+        self.camera_longitude_dms = longitude
+        self.camera_longitude_ref = str(tags.get('GPS GPSLongitudeRef', ''))
+        self.camera_latitude_dms = latitude
+        self.camera_latitude_ref = str(tags.get('GPS GPSLatitudeRef', ''))
+        self.camera_altitude = altitude
+    
+    def read_gimbal_angles(self):
+        """Sets camera_pitch and camera_yaw from the XMP. Kept apart from __init__ so images filtered out on EXIF skip it."""
+        xmp_string = self.xmp
         if self.camera_maker == "DJI" or self.camera_maker == "Hasselblad":
             try:
-                xmp_string = ImageMetadata.get_xmp_as_xml_string(imagename)
-                if xmp_string is not None:
-                    e = ET.ElementTree(ET.fromstring(xmp_string))
-                    try:
-                        for elt in e.iter():
-                            if elt.tag == "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}Description":
-                                self.camera_pitch = float(elt.attrib['{http://www.dji.com/drone-dji/1.0/}GimbalPitchDegree'])
-                                self.camera_yaw = float(elt.attrib['{http://www.dji.com/drone-dji/1.0/}GimbalYawDegree'])
-                    except KeyError as Ex:
-                        logging.error("KeyError exception {} : {}".format(imagename, Ex))
-                        pass # I don't consider this fatal since we did find lat/long
-            except Exception as Ex:
-                logging.error("Exception while reading {} extended image metadata: {}".format(imagename, Ex))
-                pass # I don't consider this fatal since we did find lat/long
-        elif self.camera_maker == "SONY":
-            try:
-                xmp_string = ImageMetadata.get_xmp_as_xml_string(imagename)
                 if xmp_string is not None:
-                    e = ET.ElementTree(ET.fromstring(xmp_string))
-                    try:
-                        for elt in e.iter():
-                            pass
-                    except Exception as Ex:
-                        logging.warning("KeyError exception {} : {}".format(imagename, Ex))
-                        pass # I don't consider this fatal since we did find lat/long
+                    for m in _GIMBAL_RE.finditer(xmp_string):
+                        if m.group(1) == b'Pitch':
+                            if self.camera_pitch is None:
+                                self.camera_pitch = float(m.group(2))
+                        elif self.camera_yaw is None:
+                            self.camera_yaw = float(m.group(2))
+                        if self.camera_pitch is not None and self.camera_yaw is not None:
+                            break # The two angles sit next to each other, so this stops early in the XMP
+                    if self.camera_pitch is None:
+                        # Not in the usual layout (e.g. single quoted attributes), so do a full XML parse
+                        root = ET.fromstring(xmp_string)
+                        for elt in root.iter(_NS_DESC): # Let ElementTree do the tag filtering
+                            pitch = elt.get(_NS_PITCH) # None if missing, no KeyError to catch
+                            if pitch is not None:
+                                yaw = elt.get(_NS_YAW)
+                                self.camera_pitch = float(pitch)
+                                self.camera_yaw = float(yaw) if yaw is not None else None
+                                break # Only one Description carries the gimbal angles
             except Exception as Ex:
-                logging.warning("Exception while reading {} extended image metadata: {}".format(imagename, Ex))
+                logging.error("Exception while reading %s extended image metadata: %s", self.image_name, Ex)
                 pass # I don't consider this fatal since we did find lat/long
         else:
-            pass # Unknown camera type     
+            pass # SONY or unknown camera type, nothing we use in the XMP
                
     @staticmethod
-    def get_xmp_as_xml_string(imagename):
-        """Return extended metadata of JPG image. E.g. Yaw, Pitch, Roll is available here"""
-        with Image.open(imagename) as im:
-            for segment,content in im.applist:
-                if segment == 'APP1' and b"<x:xmpmeta" in content:
-                    start = content.index(b"<x:xmpmeta")
-                    end = content.index(b"</x:xmpmeta>") + len(b"</x:xmpmeta>")
-                    return content[start:end].decode()
-        return None
+    def read_metadata(imagename):
+        """Return (exif tags, xmp) of JPG image from a single open. xmp is the extended metadata (e.g. Yaw, Pitch, Roll) as raw XML bytes or None"""
+        with open(imagename, 'rb') as image_file:
+            head = image_file.read(JPEG_HEAD_BYTES)
+            
+            def read_at(offset, size):
+                """Bytes of the file at offset, from head when they are in it"""
+                if offset + size <= len(head):
+                    return head[offset:offset + size]
+                image_file.seek(offset)
+                return image_file.read(size)
+            
+            # XMP lives in an APP1 segment of the JPEG header. Walk the segment headers (marker, 2 byte length)
+            # up to the start of the image data, so it is found wherever it is without reading the image itself.
+            xmp = None
+            offset = 2 if head.startswith(b"\xff\xd8") else None # None: no SOI marker, not a JPEG
+            while offset is not None:
+                header = read_at(offset, 4)
+                if len(header) < 4 or header[0] != 0xFF:
+                    break # Truncated or corrupt header
+                marker = header[1]
+                if marker == 0xFF: # Fill byte before a marker
+                    offset += 1
+                    continue
+                if marker == 0xDA or marker == 0xD9: # Start of scan or end of image, no more metadata
+                    break
+                length = int.from_bytes(header[2:4], 'big') # Includes the 2 length bytes
+                if marker == 0xE1 and read_at(offset + 4, len(_XMP_APP1_ID)) == _XMP_APP1_ID:
+                    segment = read_at(offset + 4, length - 2)
+                    start = segment.find(b"<x:xmpmeta")
+                    end = segment.find(b"</x:xmpmeta>", start)
+                    if start != -1 and end != -1: # A truncated XMP packet is not fatal, we still have the exif
+                        xmp = segment[start:end + len(b"</x:xmpmeta>")]
+                    break
+                offset += 2 + length
+            
+            # Parse just the EXIF header instead of opening the image. No MakerNotes, no thumbnail and the GPS IFD only up to the altitude.
+            # EXIF is the first segment of the header and is already in memory, so exifread's many small seeks and reads don't go to disk.
+            tags = exifread.process_file(io.BytesIO(head), details=False, stop_tag='GPSAltitude', extract_thumbnail=False)
+            if not tags and os.fstat(image_file.fileno()).st_size > len(head): # EXIF not in what we read, unusual header layout
+                tags = exifread.process_file(image_file, details=False, stop_tag='GPSAltitude', extract_thumbnail=False)
+        return tags, xmp
     
     @staticmethod
-    def convert_to_degrees(value):
-        """Returns float angle when given a list of [degrees, minutes, seconds]"""
-        d0 = value[0]
-        m0 = value[1]
-        s0 = value[2]  
-        return float(d0) + (float(m0)/60.0) + (float(s0)/3600.0)
+    def convert_to_dms(value):
+        """Returns a (degrees, minutes, seconds) tuple of floats when given the list of EXIF rationals"""
+        return (float(value[0]), float(value[1]), float(value[2]))
+
+# What process_image sends back from a pool worker. Plain floats, bools and a str, so it is small and cheap to pickle.
+ImageRecord = collections.namedtuple('ImageRecord', ['imagename', 'latitude_dms', 'is_south', 'longitude_dms', 'is_west', 
+                                                     'altitude', 'is_nadir', 'yaw'])
+
+def init_worker(log_queue, log_level):
+    """Pool initializer. Routes the worker's log records to the parent process which owns the log file."""
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(log_level)
+
+def process_image(imagename, nadir_or_oblique, min_altitude, max_altitude):
+    """Returns an ImageRecord for an image that passes the type and altitude filters, None otherwise"""
+    image_is_nadir = False  
+    
+    try:
+        imagemetadata = ImageMetadata(imagename)
+    except Exception as Ex: # Unreadable file or not an image at all
+        logging.error("Error reading %s metadata. %s", imagename, Ex)     
+        return None
+    
+    if imagemetadata.camera_latitude_dms is None: # No usable GPS information, already logged
+        return None
+    
+    # Cheapest filter first, so images outside the altitude range skip the XMP parse
+    if not(min_altitude < imagemetadata.camera_altitude < max_altitude):
+        return None
+    
+    imagemetadata.read_gimbal_angles()
+    
+    if imagemetadata.camera_pitch is not None:
+        if imagemetadata.camera_pitch < InspectImages.NADIRLIMIT:
+            image_is_nadir = True
+        # Arguments are only formatted if debug logging is on
+        logging.debug("%s : %s : %s : %s", imagename, 
+                                           imagemetadata.camera_maker, 
+                                           imagemetadata.camera_model,
+                                           imagemetadata.camera_pitch)
+    else:
+        image_is_nadir = True # If no pitch is available, assume Nadir image 
+        logging.warning("No pitch available for image %s", imagename)
+    
+    if nadir_or_oblique == 'N':
+        if image_is_nadir == False:
+            return None
+    elif nadir_or_oblique == 'O':
+        if image_is_nadir == True:
+            return None
+    
+    return ImageRecord(imagename, 
+                       imagemetadata.camera_latitude_dms, 
+                       imagemetadata.camera_latitude_ref == "S", 
+                       imagemetadata.camera_longitude_dms, 
+                       imagemetadata.camera_longitude_ref == "W", 
+                       imagemetadata.camera_altitude, 
+                       image_is_nadir, 
+                       imagemetadata.camera_yaw)
 
 class InspectImages:
     NADIRLIMIT = -88.0   # If Gimbal Pitch is < NADIRLIMIT then the image is consider Nadir else Oblique
     cardinals = 36       # Map angle to nearest cardinal direction (specify 4, 8, 12, 18, 36)
+    _correction = 360.0 / (2.0 * cardinals)  # Half a sector, so each cardinal is centred on its direction
+    _cardinals_per_degree = cardinals / 360.0
 
     def __init__(self, args):
         self._args = args
@@ -163,65 +305,79 @@ class InspectImages:
         self.min_altitude = self._args["alt"][0]
         self.max_altitude = self._args["alt"][1]
         self.image_type = self._args["type"] # Image type Nadir (N), Oblique (O), Any (A). Defaults to (A)
-        self.display_kml = None # Shows both the images and the boundary
-        self.points = [] # # points is a list of (latitude, longitude) tuples
+        self.records = [] # ImageRecords of the images that passed the filters, in the same order as points
+        self.hull_kml = None # Boundary polygon placemark, added to the image locations for Images_and_Boundary.kml
+        self.points = np.empty((0, 2)) # Image locations, one (longitude, latitude) row per image
 
     @staticmethod
-    def get_xmp_as_xml_string(imagename):
-        """Return extended metadata of JPG image. E.g. Yaw, Pitch, Roll is available here"""
-        with Image.open(imagename) as im:
-            for segment,content in im.applist:
-                if segment == 'APP1' and b"<x:xmpmeta" in content:
-                    start = content.index(b"<x:xmpmeta")
-                    end = content.index(b"</x:xmpmeta>") + len(b"</x:xmpmeta>")
-                    return content[start:end].decode()
-        return None
-    
-    @staticmethod
-    def convert_to_degrees(value):
-        """Returns float angle when given a list of [degrees, minutes, seconds]"""
-        d0 = value[0]
-        m0 = value[1]
-        s0 = value[2]  
-        return float(d0) + (float(m0)/60.0) + (float(s0)/3600.0)
+    def convert_to_degrees(dms, negative):
+        """Returns an array of float angles when given a list of [degrees, minutes, seconds] and a matching list of S/W flags"""
+        dms = np.asarray(dms, dtype=np.float64).reshape(-1, 3)
+        degrees = dms[:, 0] + dms[:, 1] * (1.0/60.0) + dms[:, 2] * (1.0/3600.0)
+        return np.where(negative, -np.abs(degrees), degrees)
 
     @staticmethod
     def degrees_to_cardinals(degrees):
         """Returns a cardinal value for an angle [0, 360] => [0, InspectImages.cardinals-1]. Applies correction to angle."""
-        correction = 360.0 / (2.0 * InspectImages.cardinals)
-        return math.floor((float((degrees + correction + 360) % 360.0)/360.0) * float(InspectImages.cardinals))
+        # Python's float % is never negative, so int() floors here
+        return int(((degrees + InspectImages._correction) % 360.0) * InspectImages._cardinals_per_degree)
     
     def CreateHull(self):
         self.boundary_kml = None # This is the boundary derived from image lat/long (convex hull)
         
-        # points is a list of (latitude, longitude) tuples (i.e., image locations)
+        # points is an (N, 2) float array of (longitude, latitude) rows, which qhull uses without a copy
         if len(self.points) > 2:   # ConvexHull needs at least 3 points
-            hull = ConvexHull(self.points)
+            try:
+                hull = ConvexHull(self.points)
+            except QhullError as Ex: # All images in a line or at one spot, there is no area to outline
+                logging.error("Unable to create boundary from image locations: %s", Ex)
+                return # The image KML files are still written, just without a boundary
         else:
             return
 
-        # create the KML document
-        self.boundary_kml = Kml()
-
-        coords = [(self.points[i][0],self.points[i][1]) for i in hull.vertices]
+        coords = self.points[hull.vertices].tolist()
         coords.append(coords[0])
 
-        polygon = Polygon(outerboundaryis=coords)
-
-        #adding polygon to the boundary_kml
-        pol = self.boundary_kml.newpolygon(name='Convex Hull', outerboundaryis=coords)
-        pol.style.polystyle.color = '00000000' # 00 for transparent and ff for opaque
-        pol.style.polystyle.fill = 1
-        pol.style.linestyle.width = 5
-        pol.style.linestyle.color = Color.green
+        polygon = KML_POLYGON.format('Convex Hull', 'hull', ' '.join("{},{}".format(lon, lat) for lon, lat in coords))
 
+        # create the boundary KML document
+        self.boundary_kml = [KML_HULL_STYLE, polygon]
+        self.hull_kml = polygon
+    
+    def save_images_and_boundary(self, imageslocation, outputlocation):
+        """Writes the image locations to imageslocation, and again with the boundary polygon (if any) added to outputlocation"""
+        # Styles for oblique images - one for each cardinal direction. Followed by the style for nadir images and the boundary.
+        styles = [KML_CARDINAL_STYLE.format(i, i * 360.0/float(InspectImages.cardinals)) for i in range(InspectImages.cardinals)]
+        styles.append(KML_NADIR_STYLE)
+        styles.append(KML_HULL_STYLE)
+        
+        # Yaw to cardinal style id lookup at 0.1 degree resolution, indexed by int((yaw + 360) * 10) % 3600.
+        # The cardinal boundaries are all multiples of 0.1 degree so the table gives the same answer as degrees_to_cardinals.
+        cardinal_lut = ['dir{}'.format(InspectImages.degrees_to_cardinals(i / 10.0)) for i in range(3600)]
         
-        # Now add polygon to the display_kml (this already has image locations)
-        pol = self.display_kml.newpolygon(name='Convex Hull', outerboundaryis=coords)
-        pol.style.polystyle.color = '00000000' # 00 for transparent and ff for opaque
-        pol.style.polystyle.fill = 1
-        pol.style.linestyle.width = 5
-        pol.style.linestyle.color = Color.green
+        # Both files share everything but the polygon, so each piece is built once and streamed to both
+        with open(imageslocation, 'w', encoding='utf-8', buffering=KML_BUFFER_BYTES) as images_file, \
+             open(outputlocation, 'w', encoding='utf-8', buffering=KML_BUFFER_BYTES) as both_file:
+            images_write = images_file.write # Local names for the per image loop
+            both_write = both_file.write
+            format_point = KML_POINT.format
+            
+            head = KML_HEADER + ''.join(styles) + '<Folder><name>VIMANA</name>\n'
+            images_write(head)
+            both_write(head)
+            for result, (longitude, latitude) in zip(self.records, self.points.tolist()):
+                if result.is_nadir == True or result.yaw is None: # No pitch means assumed Nadir, no yaw means no direction to show
+                    style = 'nadir'
+                else:
+                    style = cardinal_lut[int((result.yaw + 360.0) * 10) % 3600] # Refer to a predefined style
+                point = format_point(result.altitude, style, longitude, latitude)
+                images_write(point)
+                both_write(point)
+            images_write('</Folder>\n' + KML_FOOTER)
+            both_write('</Folder>\n')
+            if self.hull_kml is not None:
+                both_write(self.hull_kml)
+            both_write(KML_FOOTER)
         
     def process(self):
         camera_yaw = None
@@ -240,76 +396,42 @@ class InspectImages:
             self.max_altitude = swap
         
         
-        # Dictionary of styles for oblique images - one for each cardinal direction
-        style_dict = {}
-        for i in range(InspectImages.cardinals):
-            style_dict[i] = Style()
-            style_dict[i].iconstyle.icon.href = 'https://earth.google.com/images/kml-icons/track-directional/track-0.png'
-            style_dict[i].iconstyle.heading = i * 360.0/float(InspectImages.cardinals)
-        
-        # Style for nadir images
-        shared_nadir_style = Style()
-        shared_nadir_style.iconstyle.icon.href = 'http://maps.google.com/mapfiles/kml/shapes/placemark_circle.png'
-        shared_nadir_style.labelstyle.color = 'ff0000ff'  # Red
-        
-        try:
-            self.display_kml = Kml()
-            folder = self.display_kml.newfolder(name='VIMANA')
-            # sharedstyle.labelstyle.color = "ff0000ff"  # Red
-        except Exception as Ex:
-            logging.critical("No idea what happened. Do you have permission? {}".format(Ex))
-            exit(0)
-        
         root_folder = input_folder    
-        found_images = False
-         
-        for input_folder, dir_names, filenames in os.walk(root_folder):
-            img_contents = [s for s in os.listdir(input_folder) if s.endswith('.JPG') or s.endswith('.jpg')] # Only pick .JPG or .jpg
-                
-            if img_contents != []:
-                found_images = True
-                
-            for image in img_contents:
-                imagename = os.path.join(input_folder, image)
-                    
-                image_is_nadir = False  
-                
-                try:
-                    imagemetadata = ImageMetadata(imagename)
-                    if imagemetadata.camera_pitch is not None:
-                        if imagemetadata.camera_pitch < InspectImages.NADIRLIMIT:
-                                    image_is_nadir = True
-                        logging.debug("{} : {} : {} : {}".format(imagename, 
-                                                             imagemetadata.camera_maker, 
-                                                             imagemetadata.camera_model,
-                                                             imagemetadata.camera_pitch))
-                    else:
-                        image_is_nadir = True # If no pitch is available, assume Nadir image 
-                        logging.warning("No pitch available for image {}".format(imagename))
-                except Exception as Ex:
-                    logging.error("Error reading {} metadata. {}".format(imagename, Ex))     
-                    continue     
-                
-                if nadir_or_oblique == 'N':
-                    if image_is_nadir == False:
-                        continue
-                elif nadir_or_oblique == 'O':
-                    if image_is_nadir == True:
-                        continue
-                
-                if not(self.min_altitude < imagemetadata.camera_altitude < self.max_altitude):
-                    continue
-                    
-                self.points.append(tuple([imagemetadata.camera_longitude, imagemetadata.camera_latitude]))
-                pnt = folder.newpoint(name="{0}".format(imagemetadata.camera_altitude), coords=[(imagemetadata.camera_longitude, imagemetadata.camera_latitude)])
-                if image_is_nadir == True or imagemetadata.camera_pitch is None: # If no yaw is available, assume Nadir image
-                    pnt.style = shared_nadir_style
-                else:
-                    pnt.style = style_dict[InspectImages.degrees_to_cardinals(imagemetadata.camera_yaw)] # Assign a predefined style
+        
+        # Collect all image paths up front so the metadata extraction can be farmed out to a process pool.
+        image_entries = iter_jpgs(root_folder)
+        if os.name != 'nt':
+            # Visiting them in inode order roughly follows their layout on disk, which cuts seeks on spinning disks.
+            # The inode comes with the directory listing here. On Windows it costs a stat per file, so keep the listing order.
+            image_entries = sorted(image_entries, key=os.DirEntry.inode)
+        image_paths = [entry.path for entry in image_entries]
 
-        if found_images == False:
+        if image_paths == []:
             logging.error("Couldn't find anything to process!!")
             sys.exit(0)            
+
+        worker = functools.partial(process_image, 
+                                   nadir_or_oblique=nadir_or_oblique, 
+                                   min_altitude=self.min_altitude, 
+                                   max_altitude=self.max_altitude)
+        
+        # Workers send their log records back through a queue so that only this process writes to the log file
+        log_queue = multiprocessing.Queue()
+        log_listener = logging.handlers.QueueListener(log_queue, *logging.root.handlers)
+        log_listener.start()
+        try:
+            with multiprocessing.Pool(os.cpu_count(), initializer=init_worker, initargs=(log_queue, logging.root.level)) as pool:
+                # imap keeps the results in image_paths order, so the KML and log output is the same from run to run
+                results = [result for result in pool.imap(worker, image_paths, chunksize=32) if result is not None]
+        finally:
+            log_listener.stop()
+        
+        # Convert all the coordinates in one go
+        latitudes = InspectImages.convert_to_degrees([result.latitude_dms for result in results], [result.is_south for result in results])
+        longitudes = InspectImages.convert_to_degrees([result.longitude_dms for result in results], [result.is_west for result in results])
+        
+        self.points = np.column_stack((longitudes, latitudes))
+        self.records = results
     
 def main(args):
     try:
@@ -329,18 +451,17 @@ def main(args):
         if image_inspector.debug_flag == True:
             logging.root.setLevel(logging.DEBUG)
         
-        image_inspector.process()
-        outputlocation = os.path.join(image_inspector.output_folder, "Images.kml")
-        image_inspector.display_kml.save(outputlocation)
+        image_inspector.process() # Reads the images, the KML files are written below
         
         image_inspector.CreateHull()
         
         outputlocation = os.path.join(image_inspector.output_folder, "Boundary.kml")
         if image_inspector.boundary_kml is not None:
-            image_inspector.boundary_kml.save(outputlocation)
+            save_kml(outputlocation, image_inspector.boundary_kml)
         
+        imageslocation = os.path.join(image_inspector.output_folder, "Images.kml")
         outputlocation = os.path.join(image_inspector.output_folder, "Images_and_Boundary.kml")
-        image_inspector.display_kml.save(outputlocation)
+        image_inspector.save_images_and_boundary(imageslocation, outputlocation)
         
         print("KML files created in {}.".format(image_inspector.output_folder))
     except Exception as Ex:
@@ -349,6 +470,7 @@ def main(args):
     
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # Needed for the process pool in the PyInstaller executable
     args = get_args()
     
     main(args)